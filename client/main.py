@@ -10,9 +10,17 @@ from typing import Optional
 import sys
 import os
 import logging
+from dotenv import load_dotenv
+
+# Make the shared top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_utils import TruncatedPayload, setup_logging, should_sample
+
+# Load environment variables
+load_dotenv()
 
 # Configure logging
-logging.basicConfig(level=logging.INFO)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 class ModernUI(tk.Tk):
@@ -29,6 +37,8 @@ class ModernUI(tk.Tk):
         self.message_queue = Queue()
         self.is_connected = False
         self.port = None
+        self.last_mood: Optional[str] = None
+        self.more_pending = False
 
         # Create and configure styles
         self.style = ttk.Style()
@@ -112,6 +122,13 @@ class ModernUI(tk.Tk):
                                     style="Modern.TButton")
         self.send_button.pack(side=tk.LEFT)
 
+        # More button, continues the last mood without repeating songs
+        self.more_button = ttk.Button(self.input_frame,
+                                    text="➕ More Like This",
+                                    command=self.send_more,
+                                    style="Modern.TButton")
+        self.more_button.pack(side=tk.LEFT, padx=(15, 0))
+
         # Create output area with custom styling
         self.output_frame = ttk.Frame(self.content_frame, style="Modern.TFrame")
         self.output_frame.pack(fill=tk.BOTH, expand=True)
@@ -133,6 +150,7 @@ class ModernUI(tk.Tk):
         
         # Initially disable the button until connected
         self.send_button.state(['disabled'])
+        self.more_button.state(['disabled'])
 
     def on_entry_click(self, event):
         """Handle entry field click."""
@@ -144,10 +162,12 @@ class ModernUI(tk.Tk):
         """Update UI elements based on connection state."""
         if self.is_connected:
             self.send_button.state(['!disabled'])
+            self.more_button.state(['!disabled' if self.last_mood and not self.more_pending else 'disabled'])
             self.status_label.config(text="🟢 Connected and Ready")
             self.status_label.config(foreground="#9ECE6A")  # Green color
         else:
             self.send_button.state(['disabled'])
+            self.more_button.state(['disabled'])
             self.status_label.config(text="🔴 Disconnected")
             self.status_label.config(foreground="#F7768E")  # Red color
         
@@ -159,10 +179,10 @@ class ModernUI(tk.Tk):
         for port in range(start_port, max_port + 1):
             try:
                 url = f"ws://127.0.0.1:{port}/ws"
-                logger.info(f"Trying to connect to {url}")
+                logger.info("Trying to connect to %s", url)
                 async with websockets.connect(url, timeout=1) as ws:
                     self.port = port
-                    logger.info(f"Found server on port {port}")
+                    logger.info("Found server on port %d", port)
                     return port
             except:
                 continue
@@ -187,11 +207,12 @@ class ModernUI(tk.Tk):
                         continue
 
                 url = f"ws://127.0.0.1:{self.port}/ws"
-                logger.info(f"Attempting to connect to WebSocket server at {url}")
+                logger.info("Attempting to connect to WebSocket server at %s", url)
                 
                 async with websockets.connect(url) as websocket:
                     self.ws = websocket
                     self.is_connected = True
+                    self.finish_more()
                     logger.info("Successfully connected to WebSocket server")
                     
                     # Update UI to show connected status
@@ -201,13 +222,14 @@ class ModernUI(tk.Tk):
                     while True:
                         try:
                             message = await websocket.recv()
-                            logger.info(f"Received message: {message}")
+                            if should_sample():
+                                logger.info("Received message: %s", TruncatedPayload(message))
                             self.handle_message(message)
                         except websockets.ConnectionClosed:
                             logger.error("WebSocket connection closed")
                             break
                         except Exception as e:
-                            logger.error(f"Error receiving message: {str(e)}")
+                            logger.error("Error receiving message: %s", e)
                             break
 
             except Exception as e:
@@ -238,7 +260,7 @@ class ModernUI(tk.Tk):
                 "params": {"mood": mood}
             }
             
-            logger.info(f"Sending mood request: {mood}")
+            logger.info("Sending mood request: %s", TruncatedPayload(mood))
             
             # Create a new event loop for this thread
             try:
@@ -251,7 +273,7 @@ class ModernUI(tk.Tk):
                 self.mood_entry.insert(0, "Enter your mood...")
                 
             except Exception as e:
-                logger.error(f"Error sending message: {str(e)}")
+                logger.error("Error sending message: %s", e)
                 self.results_area.delete(1.0, tk.END)
                 self.results_area.insert(tk.END, f"Error: {str(e)}\n")
             finally:
@@ -260,12 +282,54 @@ class ModernUI(tk.Tk):
                 self.send_button.config(text="Get Recommendations")
                 loop.close()
 
+    def send_more(self):
+        """Ask the server for more songs like the last mood."""
+        if not self.is_connected or not self.ws:
+            self.results_area.delete(1.0, tk.END)
+            self.results_area.insert(tk.END, "Not connected to server. Please wait...\n")
+            return
+
+        if not self.last_mood or self.more_pending:
+            return
+
+        # Disable button until the response arrives
+        self.more_pending = True
+        self.more_button.state(['disabled'])
+        self.more_button.config(text="Getting more songs...")
+
+        message = {
+            "command": "MORE",
+            "params": {"mood": self.last_mood}
+        }
+
+        logger.info("Sending more request: %s", TruncatedPayload(self.last_mood))
+
+        loop = asyncio.new_event_loop()
+        try:
+            asyncio.set_event_loop(loop)
+            loop.run_until_complete(self.ws.send(json.dumps(message)))
+        except Exception as e:
+            logger.error("Error sending message: %s", e)
+            self.results_area.delete(1.0, tk.END)
+            self.results_area.insert(tk.END, f"Error: {str(e)}\n")
+            self.finish_more()
+        finally:
+            loop.close()
+
+    def finish_more(self):
+        """Re-enable the more button once a MORE request is done."""
+        self.more_pending = False
+        self.more_button.config(text="➕ More Like This")
+        if self.is_connected and self.last_mood:
+            self.more_button.state(['!disabled'])
+
     def handle_message(self, message):
         """Handle incoming messages from server."""
         try:
             data = json.loads(message)
             
             if data["status"] == "success":
+                self.last_mood = data["mood"]
                 self.results_area.delete(1.0, tk.END)
                 
                 # Add header with mood
@@ -303,7 +367,8 @@ class ModernUI(tk.Tk):
                     # Separator
                     self.results_area.insert(tk.END, "   " + "─" * 40 + "\n\n")
                 
-                logger.info("Successfully displayed recommendations")
+                if should_sample():
+                    logger.info("Successfully displayed recommendations")
                 
             else:
                 error_msg = f"❌ Error: {data.get('message', 'Unknown error')}"
@@ -322,6 +387,9 @@ class ModernUI(tk.Tk):
                                           foreground="#F7768E",
                                           font=("Segoe UI", 11, "bold"))
             logger.error(error_msg)
+        finally:
+            # Any response ends a pending MORE request
+            self.finish_more()
 
 if __name__ == "__main__":
     app = ModernUI()
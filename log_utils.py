@@ -0,0 +1,87 @@
+import logging
+import logging.handlers
+import queue
+import random
+import atexit
+import os
+import sys
+
+# Logging settings: fraction of per-message logs kept, and max payload chars shown.
+# Read from the environment by setup_logging.
+DEFAULT_SAMPLE_RATE = 0.1
+DEFAULT_MAX_PAYLOAD = 200
+LOG_SAMPLE_RATE = DEFAULT_SAMPLE_RATE
+LOG_MAX_PAYLOAD = DEFAULT_MAX_PAYLOAD
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves formatting to the listener thread."""
+    def prepare(self, record):
+        # The listener runs in this process, so the record can be passed as-is
+        return record
+
+class TruncatedPayload:
+    """Lazily truncated payload, only rendered if the record is emitted."""
+    __slots__ = ("payload", "limit")
+
+    def __init__(self, payload, limit=None):
+        self.payload = payload
+        self.limit = max(0, LOG_MAX_PAYLOAD if limit is None else limit)
+
+    def __str__(self):
+        text = str(self.payload)
+        if len(text) <= self.limit:
+            return text
+        return f"{text[:self.limit]}... ({len(text)} chars)"
+
+def should_sample() -> bool:
+    """Decide whether a per-message log line should be emitted."""
+    return LOG_SAMPLE_RATE >= 1 or random.random() < LOG_SAMPLE_RATE
+
+def read_log_settings():
+    """Read LOG_SAMPLE_RATE and LOG_MAX_PAYLOAD, falling back to defaults on bad values.
+
+    Returns a list of warnings to log once logging is set up.
+    """
+    global LOG_SAMPLE_RATE, LOG_MAX_PAYLOAD
+    warnings = []
+
+    raw = os.getenv("LOG_SAMPLE_RATE")
+    LOG_SAMPLE_RATE = DEFAULT_SAMPLE_RATE
+    if raw is not None:
+        try:
+            LOG_SAMPLE_RATE = min(1.0, max(0.0, float(raw)))
+        except ValueError:
+            warnings.append(f"Invalid LOG_SAMPLE_RATE {raw!r}, using {DEFAULT_SAMPLE_RATE}")
+
+    raw = os.getenv("LOG_MAX_PAYLOAD")
+    LOG_MAX_PAYLOAD = DEFAULT_MAX_PAYLOAD
+    if raw is not None:
+        try:
+            value = int(raw)
+            if value < 0:
+                raise ValueError(raw)
+            LOG_MAX_PAYLOAD = value
+        except ValueError:
+            warnings.append(f"Invalid LOG_MAX_PAYLOAD {raw!r}, using {DEFAULT_MAX_PAYLOAD}")
+
+    return warnings
+
+def setup_logging(level=logging.INFO, stream=None, fmt=logging.BASIC_FORMAT):
+    """Route all logging through a queue so I/O happens off the event loop."""
+    warnings = read_log_settings()
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(stream if stream is not None else sys.stderr)
+    stream_handler.setFormatter(logging.Formatter(fmt))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [DeferredQueueHandler(log_queue)]
+    root.setLevel(level)
+
+    listener.start()
+    atexit.register(listener.stop)
+
+    for warning in warnings:
+        logging.getLogger(__name__).warning(warning)
+    return listener
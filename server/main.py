@@ -1,5 +1,6 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from typing import Dict, List
+from typing import Dict, List, Optional
+from collections import OrderedDict, deque
 import json
 import asyncio
 from pydantic import BaseModel
@@ -12,12 +13,15 @@ import socket
 import openai
 from openai import AsyncOpenAI
 
+# Make the shared top-level modules importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from log_utils import TruncatedPayload, setup_logging, should_sample
+
+# Load environment variables
+load_dotenv()
+
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    stream=sys.stdout
-)
+setup_logging(stream=sys.stdout, fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 def find_available_port(start_port=8000, max_port=8020):
@@ -31,9 +35,6 @@ def find_available_port(start_port=8000, max_port=8020):
                 continue
     raise RuntimeError(f"No available ports in range {start_port}-{max_port}")
 
-# Load environment variables
-load_dotenv()
-
 # Initialize FastAPI app
 app = FastAPI(title="Mood Music MCP Server")
 
@@ -53,19 +54,29 @@ class ConnectionManager:
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
-        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+        logger.info("Client connected. Total connections: %d", len(self.active_connections))
 
     def disconnect(self, websocket: WebSocket):
         self.active_connections.remove(websocket)
-        logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
+        logger.info("Client disconnected. Total connections: %d", len(self.active_connections))
 
 manager = ConnectionManager()
 
-async def get_music_recommendations(mood: str) -> List[Dict]:
+# Songs returned per page, songs fetched per background refill, and the cap on
+# songs listed in the exclusion part of the prompt
+PAGE_SIZE = 5
+PREFETCH_SIZE = 10
+MAX_EXCLUDED_SONGS = 50
+# Per-connection caps: moods kept (least recently used dropped first) and
+# songs remembered per mood
+MAX_MOOD_HISTORIES = 3
+MAX_SERVED_SONGS = 100
+
+async def get_music_recommendations(mood: str, count: int = PAGE_SIZE, exclude: Optional[List[str]] = None) -> List[Dict]:
     """Get music recommendations from OpenAI based on mood."""
     try:
         # Create a prompt for ChatGPT
-        prompt = f"""Given the mood '{mood}', suggest 5 songs that match this emotion. 
+        prompt = f"""Given the mood '{mood}', suggest {count} songs that match this emotion. 
         For each song, provide:
         1. The song name
         2. The artist name
@@ -76,6 +87,10 @@ async def get_music_recommendations(mood: str) -> List[Dict]:
         - artist: artist name
         - reason: explanation
         """
+        if exclude:
+            prompt += f"""
+        Do not suggest any of these songs (artist - name): {'; '.join(exclude)}
+        """
         
         # Get recommendations from ChatGPT
         completion = await client.chat.completions.create(
@@ -93,21 +108,142 @@ async def get_music_recommendations(mood: str) -> List[Dict]:
         return recommendations.get("songs", [])
         
     except Exception as e:
-        logger.error(f"Error getting recommendations from OpenAI: {str(e)}")
+        logger.error("Error getting recommendations from OpenAI: %s", e)
         raise e
 
-async def process_mood_command(mood: str) -> Dict:
+def song_key(song: Dict) -> str:
+    """Compact, case-insensitive identifier for a song."""
+    return f"{str(song.get('artist', '')).strip().lower()} - {str(song.get('name', '')).strip().lower()}"
+
+class MoodHistory:
+    """Songs already served for one mood, plus a prefetched buffer of the next ones."""
+    def __init__(self):
+        # Insertion-ordered so the oldest songs are dropped first
+        self.served: Dict[str, None] = {}
+        self.buffer: deque = deque()
+        self.refill_task: Optional[asyncio.Task] = None
+
+    def mark_served(self, songs: List[Dict]):
+        for song in songs:
+            key = song_key(song)
+            self.served.pop(key, None)
+            self.served[key] = None
+        while len(self.served) > MAX_SERVED_SONGS:
+            del self.served[next(iter(self.served))]
+
+    def known_keys(self) -> set:
+        return set(self.served) | {song_key(song) for song in self.buffer}
+
+    def exclusions(self) -> List[str]:
+        keys = list(self.served) + [song_key(song) for song in self.buffer]
+        return keys[-MAX_EXCLUDED_SONGS:]
+
+    def cancel_refill(self):
+        if self.refill_task and not self.refill_task.done():
+            self.refill_task.cancel()
+        # Cancellation only takes effect on the next loop iteration, so forget
+        # the task now and let the next request schedule a fresh refill
+        self.refill_task = None
+
+class MoodSession:
+    """Per-connection record of served songs for the most recently used moods."""
+    def __init__(self):
+        self.moods: "OrderedDict[str, MoodHistory]" = OrderedDict()
+        self.last_mood: Optional[str] = None
+
+    def use(self, mood: str) -> MoodHistory:
+        """Return the history for a mood, making it the current one."""
+        # Stop prefetching for a mood the user has moved away from
+        if self.last_mood and self.last_mood != mood and self.last_mood in self.moods:
+            self.moods[self.last_mood].cancel_refill()
+
+        history = self.moods.get(mood)
+        if history is None:
+            history = self.moods[mood] = MoodHistory()
+        self.moods.move_to_end(mood)
+        self.last_mood = mood
+
+        # Evict least recently used moods
+        while len(self.moods) > MAX_MOOD_HISTORIES:
+            _, evicted = self.moods.popitem(last=False)
+            evicted.cancel_refill()
+        return history
+
+    def close(self):
+        for history in self.moods.values():
+            history.cancel_refill()
+        self.moods.clear()
+
+async def refill_buffer(mood: str, history: MoodHistory):
+    """Fetch the next songs for a mood, skipping anything already served or buffered."""
+    songs = await get_music_recommendations(mood, PREFETCH_SIZE, history.exclusions())
+    known = history.known_keys()
+    for song in songs:
+        key = song_key(song)
+        if key not in known:
+            known.add(key)
+            history.buffer.append(song)
+
+def log_refill_failure(task: asyncio.Task):
+    """Log a background refill that failed, so its error is never left unretrieved."""
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        logger.warning("Background refill failed: %s", exc)
+
+def schedule_refill(mood: str, history: MoodHistory):
+    """Refill the buffer in the background once it can no longer serve a full page."""
+    if len(history.buffer) >= PAGE_SIZE:
+        return
+    if history.refill_task and not history.refill_task.done():
+        return
+    history.refill_task = asyncio.create_task(refill_buffer(mood, history))
+    history.refill_task.add_done_callback(log_refill_failure)
+
+async def next_page(session: MoodSession, mood: str) -> List[Dict]:
+    """Return the next page of unseen songs for a mood from its prefetched buffer."""
+    history = session.use(mood)
+
+    # Serve from the buffer, waiting on a refill only if it is short
+    if len(history.buffer) < PAGE_SIZE:
+        schedule_refill(mood, history)
+        if history.refill_task and not history.refill_task.cancelled():
+            await history.refill_task
+
+    page = [history.buffer.popleft() for _ in range(min(PAGE_SIZE, len(history.buffer)))]
+    if not page:
+        raise Exception("No more recommendations found for the given mood")
+
+    history.mark_served(page)
+    schedule_refill(mood, history)
+    return page
+
+async def process_mood_command(mood: str, session: Optional[MoodSession] = None) -> Dict:
     """Process the MOOD command and return music recommendations."""
     try:
         # Simple mood processing - just lowercase and match
         mood_lower = mood.lower()
-        logger.info(f"Processing mood: {mood_lower}")
-        
-        # Get recommendations from OpenAI
-        recommendations = await get_music_recommendations(mood_lower)
-        
-        if not recommendations:
-            raise Exception("No recommendations found for the given mood")
+        if should_sample():
+            logger.info("Processing mood: %s", TruncatedPayload(mood_lower))
+
+        # A repeated mood continues where it left off instead of starting over
+        if session is not None and mood_lower in session.moods:
+            recommendations = await next_page(session, mood_lower)
+        else:
+            # Get recommendations from OpenAI
+            recommendations = await get_music_recommendations(mood_lower)
+            
+            if not recommendations:
+                raise Exception("No recommendations found for the given mood")
+
+            # Remember what was served and start prefetching the next page. This
+            # costs a second OpenAI call per new mood so that MORE can answer
+            # straight from the buffer
+            if session is not None:
+                history = session.use(mood_lower)
+                history.mark_served(recommendations)
+                schedule_refill(mood_lower, history)
             
         return {
             "status": "success",
@@ -123,9 +259,33 @@ async def process_mood_command(mood: str) -> Dict:
             "message": error_msg
         }
 
+async def process_more_command(session: MoodSession, mood: str = "") -> Dict:
+    """Process the MORE command and return the next page of unseen songs."""
+    try:
+        mood_lower = mood.lower() or session.last_mood
+        if not mood_lower:
+            raise Exception("No previous mood to continue from")
+
+        page = await next_page(session, mood_lower)
+
+        return {
+            "status": "success",
+            "mood": mood_lower,
+            "recommendations": page
+        }
+
+    except Exception as e:
+        error_msg = f"Error processing more command: {str(e)}"
+        logger.error(error_msg)
+        return {
+            "status": "error",
+            "message": error_msg
+        }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
+    session = MoodSession()
     try:
         while True:
             data = await websocket.receive_text()
@@ -133,7 +293,10 @@ async def websocket_endpoint(websocket: WebSocket):
                 message = json.loads(data)
                 
                 if message.get("command") == "MOOD":
-                    response = await process_mood_command(message["params"].get("mood", ""))
+                    response = await process_mood_command(message["params"].get("mood", ""), session)
+                    await websocket.send_json(response)
+                elif message.get("command") == "MORE":
+                    response = await process_more_command(session, message.get("params", {}).get("mood", ""))
                     await websocket.send_json(response)
                 else:
                     await websocket.send_json({
@@ -142,7 +305,7 @@ async def websocket_endpoint(websocket: WebSocket):
                     })
             
             except Exception as e:
-                logger.error(f"Error processing message: {str(e)}")
+                logger.error("Error processing message: %s", e)
                 await websocket.send_json({
                     "status": "error",
                     "message": str(e)
@@ -150,24 +313,37 @@ async def websocket_endpoint(websocket: WebSocket):
     
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+    finally:
+        session.close()
 
 @app.get("/")
 async def root():
     """Health check endpoint."""
     return {"status": "online", "service": "Mood Music MCP Server"}
 
+# Send uvicorn's own loggers (connection and access lines) through the root
+# queue handler instead of its default synchronous stream handlers
+UVICORN_LOG_CONFIG = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "loggers": {
+        name: {"level": "INFO", "handlers": [], "propagate": True}
+        for name in ("uvicorn", "uvicorn.error", "uvicorn.access")
+    },
+}
+
 def start_server(port=None):
     """Start the FastAPI server"""
     if port is None:
         port = find_available_port()
-    logger.info(f"Starting server on port {port}")
-    uvicorn.run(app, host="127.0.0.1", port=port)
+    logger.info("Starting server on port %d", port)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_config=UVICORN_LOG_CONFIG)
 
 if __name__ == "__main__":
     try:
         port = find_available_port()
-        logger.info(f"Starting server on 127.0.0.1:{port}")
+        logger.info("Starting server on 127.0.0.1:%d", port)
         start_server(port)
     except Exception as e:
-        logger.error(f"Failed to start server: {str(e)}")
+        logger.error("Failed to start server: %s", e)
         sys.exit(1) 
\ No newline at end of file
@@ -0,0 +1,77 @@
+import asyncio
+
+import server.main as server
+
+
+def fake_recommendations(calls):
+    async def get_music_recommendations(mood, count=server.PAGE_SIZE, exclude=None):
+        # Returns without yielding, so background refills only start once a
+        # request awaits them
+        calls.append(mood)
+        excluded = set(exclude or [])
+        songs = []
+        index = 0
+        while len(songs) < count:
+            song = {"name": f"{mood} {index}", "artist": "artist", "reason": ""}
+            index += 1
+            if server.song_key(song) not in excluded:
+                songs.append(song)
+        return songs
+    return get_music_recommendations
+
+
+def names(response):
+    return [song["name"] for song in response["recommendations"]]
+
+
+def test_more_returns_unseen_songs(monkeypatch):
+    monkeypatch.setattr(server, "get_music_recommendations", fake_recommendations([]))
+
+    async def run():
+        session = server.MoodSession()
+        first = await server.process_mood_command("Happy", session)
+        more = await server.process_more_command(session)
+        session.close()
+        return first, more
+
+    first, more = asyncio.run(run())
+    assert more["status"] == "success"
+    assert more["mood"] == "happy"
+    assert not set(names(first)) & set(names(more))
+
+
+def test_switching_mood_away_and_back_serves_next_page(monkeypatch):
+    monkeypatch.setattr(server, "get_music_recommendations", fake_recommendations([]))
+
+    async def run():
+        session = server.MoodSession()
+        responses = [
+            await server.process_mood_command("happy", session),
+            await server.process_more_command(session),
+            await server.process_mood_command("happy", session),
+            await server.process_mood_command("sad", session),
+            await server.process_more_command(session, "happy"),
+        ]
+        session.close()
+        return responses
+
+    responses = asyncio.run(run())
+    assert all(response["status"] == "success" for response in responses)
+
+    happy = [names(response) for response in responses if response["mood"] == "happy"]
+    served = [name for page in happy for name in page]
+    assert len(served) == len(set(served))
+
+
+def test_session_keeps_only_recent_moods(monkeypatch):
+    monkeypatch.setattr(server, "get_music_recommendations", fake_recommendations([]))
+
+    async def run():
+        session = server.MoodSession()
+        for mood in ["calm", "happy", "sad", "angry"]:
+            await server.process_mood_command(mood, session)
+        moods = list(session.moods)
+        session.close()
+        return moods
+
+    assert asyncio.run(run()) == ["happy", "sad", "angry"]